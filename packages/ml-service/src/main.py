@@ -4,30 +4,30 @@ Provides price predictions and explainability for bond pricing
 """
 
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Dict, List, Optional
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+from typing import Dict, List, Optional, TypedDict
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import Ridge
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
+from numba import njit
 import joblib
-import redis
-import psycopg2
+import redis.asyncio as aioredis
+import asyncpg
+import msgpack
 from datetime import datetime, timedelta
 import asyncio
 import httpx
-import json
+import io
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="SEBI ML Service", version="1.0.0")
+app = FastAPI(title="SEBI ML Service", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Redis connection
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+redis_client = aioredis.Redis(host='localhost', port=6379, db=0, decode_responses=False)
 
 # Database connection
 DB_CONFIG = {
@@ -37,11 +37,117 @@ DB_CONFIG = {
     'password': 'password'
 }
 
+# Rating encoding lookup table (unknown ratings fall back to the lowest grade)
+RATING_CATS = ['AAA', 'AA+', 'AA', 'AA-', 'A+', 'A', 'A-', 'BBB+', 'BBB', 'BBB-']
+RATING_VALUES = np.array([1.0, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1], dtype=np.float32)
+RATING_DEFAULT = 0.1
+RATING_INDEX = pd.Index(RATING_CATS)
+
+# Model inputs, in the order build_bond_features emits them
+FEATURE_COLUMNS = [
+    'coupon', 'rating_numeric', 'issue_size', 'days_since_last_trade',
+    'days_to_maturity', 'yield',
+    'price_volatility_7d', 'price_volatility_30d',
+    'price_momentum_7d', 'price_momentum_30d',
+    'month', 'quarter'
+]
+
+# Ridge regularization strength and retraining cadence
+RIDGE_ALPHA = 1.0
+RETRAIN_INTERVAL_SECONDS = 3600
+
+# Layout of the ml_models Redis payload; bump when the per-model tuple changes
+# so blobs written by an older layout are ignored and retrained
+MODEL_PAYLOAD_FORMAT = 2
+
+# Live bond features are cached in Redis under bond_feat:{id}, and the
+# in-process table of all active bonds is rebuilt on a timer
+BOND_FEATURES_TTL_SECONDS = 30
+FEATURE_REFRESH_SECONDS = 5
+
+SQL_BOND_FEATURES = """
+    SELECT coupon, rating, issue_size, days_since_last_trade, 
+           maturity_date, last_traded_price
+    FROM bonds WHERE id = $1
+"""
+
+SQL_ACTIVE_BOND_FEATURES = """
+    SELECT id, coupon, rating, issue_size, days_since_last_trade, 
+           maturity_date, last_traded_price
+    FROM bonds WHERE maturity_date >= CURRENT_DATE
+"""
+
+# Training rows for one bond ($1) or all bonds. Only trades with an id above
+# the last folded trade id ($2/$1) are new; the 30 most recent trades at or
+# below it are fetched as lookback for the 30-trade rolling features
+SQL_TRAINING_DATA_BY_ID = """
+    SELECT 
+        t.id,
+        b.coupon,
+        b.rating,
+        b.issue_size,
+        b.days_since_last_trade,
+        t.price_per_unit as price,
+        t.executed_at as date,
+        EXTRACT(EPOCH FROM (b.maturity_date - t.executed_at)) / 86400 as days_to_maturity,
+        EXTRACT(EPOCH FROM (t.executed_at - LAG(t.executed_at) OVER (ORDER BY t.executed_at, t.id)) / 86400) as days_since_last_trade_actual
+    FROM trades t
+    JOIN bonds b ON t.bond_id = b.id
+    WHERE t.bond_id = $1
+      AND (t.id > $2 OR t.id IN (
+          SELECT id FROM trades
+          WHERE bond_id = $1 AND id <= $2
+          ORDER BY executed_at DESC, id DESC
+          LIMIT 30
+      ))
+    ORDER BY t.executed_at, t.id
+"""
+
+SQL_TRAINING_DATA_ALL = """
+    SELECT 
+        t.id,
+        b.coupon,
+        b.rating,
+        b.issue_size,
+        b.days_since_last_trade,
+        t.price_per_unit as price,
+        t.executed_at as date,
+        EXTRACT(EPOCH FROM (b.maturity_date - t.executed_at)) / 86400 as days_to_maturity,
+        EXTRACT(EPOCH FROM (t.executed_at - LAG(t.executed_at) OVER (ORDER BY t.executed_at, t.id)) / 86400) as days_since_last_trade_actual
+    FROM trades t
+    JOIN bonds b ON t.bond_id = b.id
+    WHERE t.id > $1 OR t.id IN (
+        SELECT id FROM trades
+        WHERE id <= $1
+        ORDER BY executed_at DESC, id DESC
+        LIMIT 30
+    )
+    ORDER BY t.executed_at, t.id
+"""
+
+# Internal feature payload (Redis cache / fallback lookups); never validated
+BondFeatures = TypedDict('BondFeatures', {
+    'coupon': float, 'rating_numeric': float, 'issue_size': float,
+    'days_since_last_trade': float, 'days_to_maturity': float, 'yield': float,
+    'price_volatility_7d': float, 'price_volatility_30d': float,
+    'price_momentum_7d': float, 'price_momentum_30d': float,
+    'month': float, 'quarter': float
+})
+
 class PredictionRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     bond_id: int
     features: Dict[str, float]
 
+class BatchPredictionRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
+    bond_ids: List[int]
+
 class PredictionResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, protected_namespaces=())
+    
     bond_id: int
     t7_price_mean: float
     t7_low: float
@@ -52,23 +158,61 @@ class PredictionResponse(BaseModel):
     prediction_timestamp: str
 
 class ModelInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, protected_namespaces=())
+    
     model_id: str
     version: str
     training_date: str
     performance_metrics: Dict[str, float]
     feature_count: int
 
-# Global model storage
-models = {}
-scalers = {}
+# Global model storage. Served parameters live in one immutable-by-convention
+# mapping, model_key -> (coef, intercept, mean, inv_scale, feature_importance),
+# that training replaces wholesale so readers never need a lock
+app.state.params = {}
+training_lock = asyncio.Lock()
+sufficient_stats = {}
 feature_columns = []
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize models and load data on startup"""
     logger.info("Starting ML Service...")
+    
+    # Request-path timestamps come from a clock cached once per second
+    update_clock()
+    app.state.clock_task = asyncio.create_task(clock_loop())
+    
+    app.state.pool = await asyncpg.create_pool(
+        min_size=10, max_size=50, command_timeout=60, init=init_connection, **DB_CONFIG
+    )
     await load_models()
     await schedule_retraining()
+    
+    # Compile (or load the cached) prediction kernel before serving requests
+    warmup = np.zeros(len(FEATURE_COLUMNS), dtype=np.float32)
+    predict_row(warmup, warmup, warmup, warmup, 0.0)
+    
+    # Serve predictions from an in-process feature table of all active bonds
+    app.state.features = (np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32), {})
+    app.state.feature_refresh_task = asyncio.create_task(refresh_features_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared connections on shutdown"""
+    logger.info("Stopping ML Service...")
+    app.state.retraining_task.cancel()
+    app.state.feature_refresh_task.cancel()
+    app.state.clock_task.cancel()
+    await app.state.pool.close()
+    await redis_client.close()
+
+async def init_connection(conn: asyncpg.Connection):
+    """Parse and plan the per-bond statements once on each new pool connection"""
+    # Connection.prepare() bypasses the statement cache that fetch/fetchrow
+    # consult, so run each statement once with an id that matches no rows
+    await conn.fetchrow(SQL_BOND_FEATURES, 0)
+    await conn.fetch(SQL_TRAINING_DATA_BY_ID, 0, 0)
 
 @app.get("/health")
 async def health_check():
@@ -79,52 +223,85 @@ async def health_check():
 async def predict_bond_price(bond_id: int) -> PredictionResponse:
     """Predict bond price for T+7 with confidence intervals"""
     try:
-        # Get current bond features
-        features = await get_bond_features(bond_id)
-        
-        if not features:
-            raise HTTPException(status_code=404, detail=f"Bond {bond_id} not found or insufficient data")
-        
-        # Get model for this bond (or use general model)
-        model_key = f"bond_{bond_id}" if f"bond_{bond_id}" in models else "general"
+        # Get current bond features, from the feature table when possible
+        feat_matrix, id_to_row = app.state.features
         
-        if model_key not in models:
-            raise HTTPException(status_code=503, detail="Model not available")
-        
-        model = models[model_key]
-        scaler = scalers[model_key]
-        
-        # Prepare features
-        feature_array = np.array([list(features.values())]).reshape(1, -1)
-        scaled_features = scaler.transform(feature_array)
-        
-        # Make prediction
-        prediction = model.predict(scaled_features)[0]
-        
-        # Calculate confidence intervals (simplified)
-        confidence = 0.85  # Mock confidence
-        std_dev = 0.5  # Mock standard deviation
-        t7_low = prediction - 1.96 * std_dev
-        t7_high = prediction + 1.96 * std_dev
-        
-        # Get feature importance
-        feature_importance = get_feature_importance(model, features)
+        if bond_id in id_to_row:
+            feature_row = feat_matrix[id_to_row[bond_id]]
+        else:
+            features = await get_bond_features(bond_id)
+            
+            if not features:
+                raise HTTPException(status_code=404, detail=f"Bond {bond_id} not found or insufficient data")
+            
+            feature_row = feature_vector(features)
         
-        return PredictionResponse(
-            bond_id=bond_id,
-            t7_price_mean=float(prediction),
-            t7_low=float(t7_low),
-            t7_high=float(t7_high),
-            confidence=confidence,
-            feature_importance=feature_importance,
-            model_version="v1.0",
-            prediction_timestamp=datetime.now().isoformat()
-        )
+        return predict_from_features(bond_id, feature_row)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error predicting bond {bond_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/predict/batch")
+async def predict_bond_prices(request: BatchPredictionRequest) -> List[PredictionResponse]:
+    """Predict T+7 prices for several bonds, preserving request order"""
+    try:
+        # Fetch features missing from the feature table concurrently
+        feat_matrix, id_to_row = app.state.features
+        uncached = [bid for bid in request.bond_ids if bid not in id_to_row]
+        fetched = dict(zip(uncached, await get_bond_features_many(uncached)))
+        
+        missing = [bid for bid, features in fetched.items() if not features]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Bonds {missing} not found or insufficient data")
+        
+        return [
+            predict_from_features(
+                bond_id,
+                feat_matrix[id_to_row[bond_id]] if bond_id in id_to_row else feature_vector(fetched[bond_id])
+            )
+            for bond_id in request.bond_ids
+        ]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error predicting bonds {request.bond_ids}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def predict_from_features(bond_id: int, feature_row: np.ndarray) -> PredictionResponse:
+    """Run the T+7 model for a bond given its FEATURE_COLUMNS-ordered features"""
+    # Get model for this bond (or use general model)
+    params = app.state.params
+    model_key = f"bond_{bond_id}" if f"bond_{bond_id}" in params else "general"
+    
+    if model_key not in params:
+        raise HTTPException(status_code=503, detail="Model not available")
+    
+    coef, intercept, mean, inv_scale, feature_importance = params[model_key]
+    
+    # Standardize and apply the linear model in one compiled pass
+    prediction = float(predict_row(feature_row, mean, inv_scale, coef, intercept))
+    
+    # Calculate confidence intervals (simplified)
+    confidence = 0.85  # Mock confidence
+    std_dev = 0.5  # Mock standard deviation
+    t7_low = prediction - 1.96 * std_dev
+    t7_high = prediction + 1.96 * std_dev
+    
+    return PredictionResponse(
+        bond_id=bond_id,
+        t7_price_mean=float(prediction),
+        t7_low=float(t7_low),
+        t7_high=float(t7_high),
+        confidence=confidence,
+        feature_importance=feature_importance,
+        model_version="v1.0",
+        prediction_timestamp=app.state.clock[1]
+    )
+
 @app.post("/api/train")
 async def train_model(bond_id: Optional[int] = None):
     """Trigger model training for specific bond or general model"""
@@ -140,7 +317,7 @@ async def list_models() -> List[ModelInfo]:
     """List available models and their performance"""
     model_info = []
     
-    for model_key, model in models.items():
+    for model_key in app.state.params:
         # Mock performance metrics
         metrics = {
             "mae": 0.5,
@@ -160,15 +337,19 @@ async def list_models() -> List[ModelInfo]:
 
 async def load_models():
     """Load pre-trained models from storage"""
-    global models, scalers, feature_columns
+    global feature_columns
     
     try:
         # Try to load from Redis
-        model_data = redis_client.get("ml_models")
-        if model_data:
-            model_dict = json.loads(model_data)
-            # Reconstruct models from serialized data
-            # This is simplified - in production, use proper model serialization
+        model_data = await redis_client.get("ml_models")
+        payload = joblib.load(io.BytesIO(model_data)) if model_data else None
+        if payload is not None and payload.get("format") != MODEL_PAYLOAD_FORMAT:
+            logger.warning(f"Ignoring stored models with format {payload.get('format')}")
+            payload = None
+        
+        if payload is not None:
+            feature_columns = payload["feature_columns"]
+            app.state.params = payload["models"]
             logger.info("Loaded models from Redis")
         else:
             # Train initial models
@@ -182,215 +363,398 @@ async def load_models():
 
 async def train_bond_model(bond_id: Optional[int] = None):
     """Train model for specific bond or general model"""
+    # Serialize concurrent /api/train calls and scheduled retraining
+    async with training_lock:
+        try:
+            model_key = f"bond_{bond_id}" if bond_id else "general"
+            
+            # Fold trades inserted since the last run into the ridge statistics.
+            # The watermark is the trades.id sequence rather than executed_at,
+            # which is stamped at transaction start and can commit out of order
+            stats = sufficient_stats.get(model_key) or await load_sufficient_stats(model_key)
+            after_id = int(stats['last_trade_id']) if stats else 0
+            training_data = await get_training_data(bond_id, after_id)
+            
+            if training_data:
+                stats = await update_sufficient_stats(model_key, training_data)
+            
+            if not stats:
+                logger.warning(f"No training data available for bond {bond_id}")
+                return
+            
+            global feature_columns
+            feature_columns = list(FEATURE_COLUMNS)
+            
+            # Train model
+            mean, inv_scale, coef, intercept, r2 = solve_ridge(stats)
+            
+            logger.info(f"Model trained on {int(stats['n'])} trades - R²: {r2:.3f}")
+            
+            # Store model: build the new mapping aside, then publish it in one assignment
+            app.state.params = {
+                **app.state.params,
+                model_key: (
+                    np.ascontiguousarray(coef, dtype=np.float32),
+                    intercept,
+                    mean.astype(np.float32),
+                    inv_scale.astype(np.float32),
+                    normalize_importance(coef)
+                )
+            }
+            
+            # Save to Redis
+            await save_models_to_redis()
+            
+        except Exception as e:
+            logger.error(f"Error training model: {str(e)}")
+            raise
+
+async def update_sufficient_stats(model_key: str, new_rows: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Accumulate X^T X / X^T y for a batch of engineered trades and persist them"""
+    # Stack the model features once and fill NaN values in one typed pass
+    X = np.column_stack([new_rows[c] for c in FEATURE_COLUMNS]).astype(np.float64, copy=False)
+    np.nan_to_num(X, copy=False, nan=0.0)
+    y = new_rows['price']
+    
+    stats = sufficient_stats.get(model_key)
+    if stats is None:
+        n_features = X.shape[1]
+        stats = {
+            'n': np.float64(0),
+            'sum_x': np.zeros(n_features),
+            'sum_y': np.float64(0),
+            'sum_yy': np.float64(0),
+            'xtx': np.zeros((n_features, n_features)),
+            'xty': np.zeros(n_features)
+        }
+    
+    stats = {
+        'n': stats['n'] + len(y),
+        'sum_x': stats['sum_x'] + X.sum(axis=0),
+        'sum_y': stats['sum_y'] + y.sum(),
+        'sum_yy': stats['sum_yy'] + y @ y,
+        'xtx': stats['xtx'] + X.T @ X,
+        'xty': stats['xty'] + X.T @ y,
+        'last_trade_id': np.int64(new_rows['id'].max())
+    }
+    sufficient_stats[model_key] = stats
+    
+    # Persistence is best-effort; the in-memory statistics stay authoritative
     try:
-        # Get training data
-        training_data = await get_training_data(bond_id)
-        
-        if training_data.empty:
-            logger.warning(f"No training data available for bond {bond_id}")
-            return
-        
-        # Prepare features and target
-        X = training_data.drop(['price', 'date'], axis=1, errors='ignore')
-        y = training_data['price']
-        
-        global feature_columns
-        feature_columns = list(X.columns)
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
-        
-        # Scale features
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-        
-        # Train model
-        model = Ridge(alpha=1.0)
-        model.fit(X_train_scaled, y_train)
-        
-        # Evaluate model
-        train_score = model.score(X_train_scaled, y_train)
-        test_score = model.score(X_test_scaled, y_test)
-        
-        logger.info(f"Model trained - Train R²: {train_score:.3f}, Test R²: {test_score:.3f}")
-        
-        # Store model
-        model_key = f"bond_{bond_id}" if bond_id else "general"
-        models[model_key] = model
-        scalers[model_key] = scaler
-        
-        # Save to Redis
-        await save_models_to_redis()
-        
+        buf = io.BytesIO()
+        np.savez(buf, **stats)
+        await redis_client.set(f"ml_stats:{model_key}", buf.getvalue())
     except Exception as e:
-        logger.error(f"Error training model: {str(e)}")
-        raise
+        logger.error(f"Error saving training statistics to Redis: {str(e)}")
+    
+    return stats
 
-async def get_training_data(bond_id: Optional[int] = None) -> pd.DataFrame:
-    """Get historical data for training"""
+async def load_sufficient_stats(model_key: str) -> Optional[Dict[str, np.ndarray]]:
+    """Load persisted ridge statistics for a model from Redis"""
+    # A missing, unreadable or undecodable blob refolds the full history
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        blob = await redis_client.get(f"ml_stats:{model_key}")
+        if not blob:
+            return None
         
+        with np.load(io.BytesIO(blob)) as data:
+            stats = {name: data[name] for name in data.files}
+    except Exception as e:
+        logger.error(f"Error loading training statistics from Redis: {str(e)}")
+        return None
+    
+    # Statistics watermarked by timestamp predate the trade id watermark;
+    # drop them and refold the full history
+    if 'last_trade_id' not in stats:
+        return None
+    
+    sufficient_stats[model_key] = stats
+    return stats
+
+def solve_ridge(stats: Dict[str, np.ndarray], alpha: float = RIDGE_ALPHA):
+    """Solve standardized ridge regression from accumulated statistics"""
+    n = float(stats['n'])
+    mean = stats['sum_x'] / n
+    y_mean = float(stats['sum_y']) / n
+    
+    # Per-feature scale as StandardScaler would fit it; near-constant columns
+    # (cancellation noise in the running sums) keep unit scale
+    cov = stats['xtx'] / n - np.outer(mean, mean)
+    scale = np.sqrt(np.maximum(np.diag(cov), 0.0))
+    scale[scale <= 1e-6 * np.maximum(np.abs(mean), 1.0)] = 1.0
+    
+    # Normal equations of the standardized, centered data in float32; the
+    # scaled features are zero-mean, so the intercept is the target mean
+    gram = (n * cov / np.outer(scale, scale)).astype(np.float32)
+    b = ((stats['xty'] - n * mean * y_mean) / scale).astype(np.float32)
+    A = gram.copy()
+    A.flat[::A.shape[0] + 1] += alpha
+    coef = np.linalg.solve(A, b)
+    
+    # In-sample R² from the same statistics
+    sst = float(stats['sum_yy']) - n * y_mean ** 2
+    sse = sst - 2 * float(coef @ b) + float(coef @ gram @ coef)
+    r2 = 1 - sse / sst if sst > 0 else 0.0
+    
+    return mean, 1.0 / scale, coef, y_mean, r2
+
+async def get_training_data(bond_id: Optional[int] = None, after_id: int = 0) -> Dict[str, np.ndarray]:
+    """Get engineered historical trades for training, only those with id above `after_id`"""
+    try:
+        # Trades at or below `after_id` are only fetched as lookback for the
+        # 30-trade rolling features, then dropped after feature engineering
         if bond_id:
-            query = """
-            SELECT 
-                b.coupon,
-                b.rating,
-                b.issue_size,
-                b.days_since_last_trade,
-                t.price_per_unit as price,
-                t.executed_at as date,
-                EXTRACT(EPOCH FROM (b.maturity_date - t.executed_at)) / 86400 as days_to_maturity,
-                EXTRACT(EPOCH FROM (t.executed_at - LAG(t.executed_at) OVER (ORDER BY t.executed_at)) / 86400) as days_since_last_trade_actual
-            FROM trades t
-            JOIN bonds b ON t.bond_id = b.id
-            WHERE t.bond_id = %s
-            ORDER BY t.executed_at
-            """
-            data = pd.read_sql_query(query, conn, params=[bond_id])
+            query = SQL_TRAINING_DATA_BY_ID
+            params = [bond_id, after_id]
         else:
-            query = """
-            SELECT 
-                b.coupon,
-                b.rating,
-                b.issue_size,
-                b.days_since_last_trade,
-                t.price_per_unit as price,
-                t.executed_at as date,
-                EXTRACT(EPOCH FROM (b.maturity_date - t.executed_at)) / 86400 as days_to_maturity,
-                EXTRACT(EPOCH FROM (t.executed_at - LAG(t.executed_at) OVER (ORDER BY t.executed_at)) / 86400) as days_since_last_trade_actual
-            FROM trades t
-            JOIN bonds b ON t.bond_id = b.id
-            ORDER BY t.executed_at
-            """
-            data = pd.read_sql_query(query, conn)
+            query = SQL_TRAINING_DATA_ALL
+            params = [after_id]
         
-        conn.close()
+        async with app.state.pool.acquire() as conn:
+            rows = await conn.fetch(query, *params)
+        
+        if not rows:
+            return {}
+        
+        # Decode each column straight from the records into a typed array
+        data = {
+            'id': np.fromiter((row['id'] for row in rows), dtype=np.int64, count=len(rows)),
+            'coupon': column_array(rows, 'coupon'),
+            'rating': np.array([row['rating'] for row in rows], dtype=object),
+            'issue_size': column_array(rows, 'issue_size'),
+            'days_since_last_trade': column_array(rows, 'days_since_last_trade'),
+            'price': column_array(rows, 'price', np.float64),
+            'date': np.array([row['date'] for row in rows], dtype='datetime64[us]'),
+            'days_to_maturity': column_array(rows, 'days_to_maturity'),
+            'days_since_last_trade_actual': column_array(rows, 'days_since_last_trade_actual')
+        }
         
         # Feature engineering
         data = engineer_features(data)
         
+        new = data['id'] > after_id
+        if not new.any():
+            return {}
+        data = {name: column[new] for name, column in data.items()}
+        
         return data
         
     except Exception as e:
         logger.error(f"Error getting training data: {str(e)}")
-        return pd.DataFrame()
+        return {}
 
-def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
+def column_array(rows: List[asyncpg.Record], name: str, dtype=np.float32) -> np.ndarray:
+    """Decode one numeric column of fetched records, mapping NULL to NaN"""
+    values = (row[name] for row in rows)
+    return np.fromiter((np.nan if v is None else v for v in values), dtype=dtype, count=len(rows))
+
+def engineer_features(cols: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
     """Engineer additional features for ML model"""
     # Rating encoding
-    rating_map = {
-        'AAA': 1.0, 'AA+': 0.9, 'AA': 0.8, 'AA-': 0.7,
-        'A+': 0.6, 'A': 0.5, 'A-': 0.4,
-        'BBB+': 0.3, 'BBB': 0.2, 'BBB-': 0.1
-    }
-    df['rating_numeric'] = df['rating'].map(rating_map).fillna(0.1)
+    codes = RATING_INDEX.get_indexer(cols['rating'])
+    cols['rating_numeric'] = np.where(codes >= 0, RATING_VALUES[codes.clip(0)], RATING_DEFAULT)
     
     # Yield calculation
-    df['yield'] = df['coupon'] / df['price_per_unit'] * 100
+    prices = cols['price']
+    cols['yield'] = cols['coupon'] / prices * 100
     
-    # Volatility features
-    df['price_volatility_7d'] = df['price_per_unit'].rolling(7).std()
-    df['price_volatility_30d'] = df['price_per_unit'].rolling(30).std()
-    
-    # Momentum features
-    df['price_momentum_7d'] = df['price_per_unit'].pct_change(7)
-    df['price_momentum_30d'] = df['price_per_unit'].pct_change(30)
+    # Volatility and momentum features from one pair of running sums. Variance
+    # is shift-invariant, so sum deviations from the mean price to keep the
+    # running totals small and the window differences precise
+    n = len(prices)
+    centered = prices - (prices.mean() if n else 0.0)
+    cs = np.concatenate(([0.0], np.cumsum(centered)))
+    cs2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    for window in (7, 30):
+        volatility = np.full(n, np.nan)
+        momentum = np.full(n, np.nan)
+        if n >= window:
+            sums = cs[window:] - cs[:-window]
+            sums2 = cs2[window:] - cs2[:-window]
+            variance = (sums2 - sums * sums / window) / (window - 1)
+            volatility[window - 1:] = np.sqrt(np.maximum(variance, 0.0))
+        if n > window:
+            momentum[window:] = prices[window:] / prices[:-window] - 1
+        cols[f'price_volatility_{window}d'] = volatility
+        cols[f'price_momentum_{window}d'] = momentum
     
     # Time features
-    df['month'] = pd.to_datetime(df['date']).dt.month
-    df['quarter'] = pd.to_datetime(df['date']).dt.quarter
-    
-    # Fill NaN values
-    df = df.fillna(method='ffill').fillna(0)
+    month = cols['date'].astype('datetime64[M]').astype(np.int64) % 12 + 1
+    cols['month'] = month
+    cols['quarter'] = (month - 1) // 3 + 1
     
-    return df
+    return cols
 
-async def get_bond_features(bond_id: int) -> Dict[str, float]:
+async def get_bond_features(bond_id: int) -> BondFeatures:
     """Get current features for a bond"""
+    # The Redis cache is best-effort: on any cache error fall through to the DB
+    cache_key = f"bond_feat:{bond_id}"
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
-        # Get bond data
-        cursor.execute("""
-            SELECT coupon, rating, issue_size, days_since_last_trade, 
-                   maturity_date, last_traded_price
-            FROM bonds WHERE id = %s
-        """, [bond_id])
-        
-        bond_data = cursor.fetchone()
-        if not bond_data:
-            return {}
-        
-        coupon, rating, issue_size, days_since_last_trade, maturity_date, last_price = bond_data
-        
-        # Calculate features
-        days_to_maturity = (maturity_date - datetime.now()).days
-        
-        # Rating encoding
-        rating_map = {
-            'AAA': 1.0, 'AA+': 0.9, 'AA': 0.8, 'AA-': 0.7,
-            'A+': 0.6, 'A': 0.5, 'A-': 0.4,
-            'BBB+': 0.3, 'BBB': 0.2, 'BBB-': 0.1
-        }
-        rating_numeric = rating_map.get(rating, 0.1)
-        
-        # Yield
-        yield_val = coupon / last_price * 100 if last_price > 0 else 0
-        
-        features = {
-            'coupon': float(coupon),
-            'rating_numeric': rating_numeric,
-            'issue_size': float(issue_size or 0),
-            'days_since_last_trade': float(days_since_last_trade),
-            'days_to_maturity': float(days_to_maturity),
-            'yield': yield_val,
-            'price_volatility_7d': 0.5,  # Mock - should calculate from historical data
-            'price_volatility_30d': 0.8,
-            'price_momentum_7d': 0.01,
-            'price_momentum_30d': 0.02,
-            'month': float(datetime.now().month),
-            'quarter': float(datetime.now().quarter)
-        }
-        
-        conn.close()
-        return features
-        
+        cached = await redis_client.get(cache_key)
     except Exception as e:
-        logger.error(f"Error getting bond features: {str(e)}")
+        logger.error(f"Error reading bond feature cache: {str(e)}")
+        cached = None
+    
+    if cached:
+        return msgpack.unpackb(cached)
+    
+    # Database errors propagate, so callers can tell them apart from unknown bonds
+    bond_data = await app.state.pool.fetchrow(SQL_BOND_FEATURES, bond_id)
+    if not bond_data:
         return {}
+    
+    features = build_bond_features(bond_data)
+    
+    try:
+        await redis_client.set(cache_key, msgpack.packb(features), ex=BOND_FEATURES_TTL_SECONDS)
+    except Exception as e:
+        logger.error(f"Error writing bond feature cache: {str(e)}")
+    
+    return features
 
-def get_feature_importance(model, features: Dict[str, float]) -> Dict[str, float]:
-    """Get feature importance for model explainability"""
-    if hasattr(model, 'coef_'):
-        # Ridge regression coefficients
-        importance = dict(zip(feature_columns, model.coef_))
-    else:
-        # Mock importance for other models
-        importance = {feature: 0.1 for feature in features.keys()}
+async def get_bond_features_many(bond_ids: List[int]) -> List[BondFeatures]:
+    """Get current features for several bonds, one pooled connection per cache miss"""
+    if not bond_ids:
+        return []
+    
+    # The Redis cache is best-effort: on any cache error fall through to the DB
+    try:
+        cached = await redis_client.mget([f"bond_feat:{bond_id}" for bond_id in bond_ids])
+    except Exception as e:
+        logger.error(f"Error reading bond feature cache: {str(e)}")
+        cached = [None] * len(bond_ids)
     
-    # Normalize to 0-1 range
-    max_importance = max(abs(v) for v in importance.values()) if importance else 1
-    normalized = {k: abs(v) / max_importance for k, v in importance.items()}
+    # Database errors propagate, so callers can tell them apart from unknown bonds
+    missing = [bond_id for bond_id, blob in zip(bond_ids, cached) if blob is None]
+    rows = await asyncio.gather(
+        *(app.state.pool.fetchrow(SQL_BOND_FEATURES, bond_id) for bond_id in missing)
+    )
+    fetched = {
+        bond_id: build_bond_features(bond_data)
+        for bond_id, bond_data in zip(missing, rows) if bond_data
+    }
     
-    return normalized
+    if fetched:
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for bond_id, features in fetched.items():
+                    pipe.set(f"bond_feat:{bond_id}", msgpack.packb(features), ex=BOND_FEATURES_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error writing bond feature cache: {str(e)}")
+    
+    return [
+        msgpack.unpackb(blob) if blob is not None else fetched.get(bond_id, {})
+        for bond_id, blob in zip(bond_ids, cached)
+    ]
+
+def update_clock():
+    """Cache the current time, truncated to the second, with its ISO string"""
+    now = datetime.now().replace(microsecond=0)
+    app.state.clock = (now, now.isoformat())
+
+async def clock_loop():
+    """Refresh the cached clock once per second"""
+    while True:
+        update_clock()
+        await asyncio.sleep(1)
+
+@njit(cache=True, fastmath=True)
+def predict_row(x, mean, inv_scale, coef, intercept):
+    """Standardize one float32 feature row and apply the ridge coefficients"""
+    acc = intercept
+    for i in range(x.shape[0]):
+        acc += coef[i] * (x[i] - mean[i]) * inv_scale[i]
+    return acc
+
+def feature_vector(features: BondFeatures) -> np.ndarray:
+    """Order a feature dict as a model input row"""
+    return np.fromiter((features[c] for c in FEATURE_COLUMNS), dtype=np.float32, count=len(FEATURE_COLUMNS))
+
+async def refresh_features_loop():
+    """Periodically rebuild the feature table for all active bonds"""
+    while True:
+        try:
+            await refresh_feature_table()
+        except Exception as e:
+            logger.error(f"Error refreshing feature table: {str(e)}")
+        await asyncio.sleep(FEATURE_REFRESH_SECONDS)
+
+async def refresh_feature_table():
+    """Load all active bonds in one query and swap in a new feature table"""
+    rows = await app.state.pool.fetch(SQL_ACTIVE_BOND_FEATURES)
+    
+    feat_matrix = build_feature_matrix([tuple(row)[1:] for row in rows])
+    id_to_row = {row['id']: i for i, row in enumerate(rows)}
+    
+    # Single assignment, so readers always see a consistent (matrix, index) pair
+    app.state.features = (feat_matrix, id_to_row)
+
+def build_bond_features(bond_data) -> BondFeatures:
+    """Derive model features from a bonds table row"""
+    return dict(zip(FEATURE_COLUMNS, build_feature_matrix([bond_data])[0].tolist()))
+
+def build_feature_matrix(bond_rows: List[tuple]) -> np.ndarray:
+    """Derive a float32 (n_bonds, n_features) matrix in FEATURE_COLUMNS order from bonds table rows"""
+    feat_matrix = np.empty((len(bond_rows), len(FEATURE_COLUMNS)), dtype=np.float32)
+    if not bond_rows:
+        return feat_matrix
+    
+    coupon, rating, issue_size, days_since_last_trade, maturity_date, last_price = zip(*bond_rows)
+    coupon = np.array(coupon, dtype=np.float32)
+    last_price = np.array([p or 0 for p in last_price], dtype=np.float32)
+    now = app.state.clock[0]
+    
+    # Calculate features
+    days_to_maturity = np.array(maturity_date, dtype='datetime64[D]') - np.datetime64(now.date(), 'D')
+    
+    # Rating encoding
+    codes = RATING_INDEX.get_indexer(rating)
+    
+    # Yield
+    yield_val = np.divide(coupon * 100, last_price, out=np.zeros_like(coupon), where=last_price > 0)
+    
+    columns = {
+        'coupon': coupon,
+        'rating_numeric': np.where(codes >= 0, RATING_VALUES[codes.clip(0)], RATING_DEFAULT),
+        'issue_size': [size or 0 for size in issue_size],
+        'days_since_last_trade': [days or 0 for days in days_since_last_trade],
+        'days_to_maturity': days_to_maturity.astype(np.float32),
+        'yield': yield_val,
+        'price_volatility_7d': 0.5,  # Mock - should calculate from historical data
+        'price_volatility_30d': 0.8,
+        'price_momentum_7d': 0.01,
+        'price_momentum_30d': 0.02,
+        'month': now.month,
+        'quarter': (now.month - 1) // 3 + 1
+    }
+    
+    # Fill column by column into one contiguous float32 block
+    for i, name in enumerate(FEATURE_COLUMNS):
+        feat_matrix[:, i] = columns[name]
+    
+    return feat_matrix
+
+def normalize_importance(coef: np.ndarray) -> Dict[str, float]:
+    """Normalize absolute ridge coefficients to the 0-1 range, once per trained model"""
+    importance = {k: abs(float(v)) for k, v in zip(feature_columns, coef)}
+    max_importance = max(importance.values(), default=0.0) or 1.0
+    
+    return {k: v / max_importance for k, v in importance.items()}
 
 async def save_models_to_redis():
     """Save models to Redis for persistence"""
     try:
-        # In production, use proper model serialization (joblib, pickle, etc.)
-        model_data = {
-            "models": {k: "serialized_model" for k in models.keys()},
-            "scalers": {k: "serialized_scaler" for k in scalers.keys()},
+        payload = {
+            "format": MODEL_PAYLOAD_FORMAT,
+            "models": app.state.params,
             "feature_columns": feature_columns,
             "timestamp": datetime.now().isoformat()
         }
         
-        redis_client.set("ml_models", json.dumps(model_data))
+        buf = io.BytesIO()
+        joblib.dump(payload, buf, compress=3)
+        await redis_client.set("ml_models", buf.getvalue())
         logger.info("Models saved to Redis")
         
     except Exception as e:
@@ -399,8 +763,20 @@ async def save_models_to_redis():
 async def schedule_retraining():
     """Schedule periodic model retraining"""
     # In production, use a proper task scheduler (Celery, APScheduler, etc.)
+    app.state.retraining_task = asyncio.create_task(retraining_loop())
     logger.info("Model retraining scheduled")
 
+async def retraining_loop():
+    """Periodically fold new trades into every trained model"""
+    while True:
+        await asyncio.sleep(RETRAIN_INTERVAL_SECONDS)
+        for model_key in list(app.state.params):
+            bond_id = None if model_key == "general" else int(model_key.split("_")[1])
+            try:
+                await train_bond_model(bond_id)
+            except Exception as e:
+                logger.error(f"Error retraining {model_key}: {str(e)}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
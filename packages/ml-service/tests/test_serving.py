@@ -0,0 +1,194 @@
+"""
+Checks for the serving path: feature table construction and the prediction routes
+"""
+
+import asyncio
+from datetime import date, datetime
+from decimal import Decimal
+
+import msgpack
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+NOW = datetime(2026, 10, 15, 12, 0, 0)
+MATURITY = date(2030, 1, 1)
+
+# bonds table rows in SQL_BOND_FEATURES column order
+BOND_COLUMNS = ['coupon', 'rating', 'issue_size', 'days_since_last_trade', 'maturity_date', 'last_traded_price']
+FULL_ROW = (Decimal("7.50"), "AA", Decimal("5000000"), 3, MATURITY, Decimal("98.50"))
+NULL_ROW = (Decimal("9.25"), None, None, None, MATURITY, None)
+UNKNOWN_RATING_ROW = (Decimal("8.00"), "D", Decimal("1000000"), 10, MATURITY, Decimal("100.00"))
+
+
+class Record(tuple):
+    """Stand-in for asyncpg.Record: positional and by-name access"""
+
+    def __new__(cls, **fields):
+        record = super().__new__(cls, fields.values())
+        record.fields = fields
+        return record
+
+    def __getitem__(self, key):
+        return self.fields[key] if isinstance(key, str) else super().__getitem__(key)
+
+
+class FakePool:
+    def __init__(self, bonds, fail=False):
+        self.bonds = bonds
+        self.fail = fail
+
+    async def fetchrow(self, query, bond_id):
+        if self.fail:
+            raise ConnectionError("db down")
+        return self.bonds.get(bond_id)
+
+    async def fetch(self, query):
+        return [Record(id=bond_id, **dict(zip(BOND_COLUMNS, row))) for bond_id, row in self.bonds.items()]
+
+
+class FakePipeline:
+    def __init__(self, store):
+        self.store = store
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def execute(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.store)
+
+
+def column(feat_matrix, name):
+    return feat_matrix[:, main.FEATURE_COLUMNS.index(name)]
+
+
+@pytest.fixture(autouse=True)
+def fixed_clock(monkeypatch):
+    monkeypatch.setattr(main.app.state, "clock", (NOW, NOW.isoformat()), raising=False)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # The general model predicts each bond's coupon, so results identify their bond
+    n_features = len(main.FEATURE_COLUMNS)
+    coef = np.zeros(n_features, dtype=np.float32)
+    coef[main.FEATURE_COLUMNS.index('coupon')] = 1.0
+    params = {"general": (coef, 0.0, np.zeros(n_features, dtype=np.float32), np.ones(n_features, dtype=np.float32), {})}
+
+    monkeypatch.setattr(main, "redis_client", FakeRedis())
+    monkeypatch.setattr(main.app.state, "params", params)
+    monkeypatch.setattr(main.app.state, "pool", FakePool({1: FULL_ROW, 2: NULL_ROW, 3: UNKNOWN_RATING_ROW}), raising=False)
+    monkeypatch.setattr(main.app.state, "features", (main.build_feature_matrix([FULL_ROW]), {1: 0}), raising=False)
+
+    # Not entered as a context manager, so startup (DB, Redis, training) never runs
+    return TestClient(main.app)
+
+
+def test_build_feature_matrix_values_and_order():
+    feat_matrix = main.build_feature_matrix([FULL_ROW, NULL_ROW, UNKNOWN_RATING_ROW])
+
+    assert feat_matrix.dtype == np.float32
+    assert feat_matrix.shape == (3, len(main.FEATURE_COLUMNS))
+    assert not np.isnan(feat_matrix).any()
+
+    expected = {
+        'coupon': [7.5, 9.25, 8.0],
+        'rating_numeric': [0.8, 0.1, 0.1],
+        'issue_size': [5000000, 0, 1000000],
+        'days_since_last_trade': [3, 0, 10],
+        'days_to_maturity': [(MATURITY - NOW.date()).days] * 3,
+        'yield': [7.5 * 100 / 98.5, 0, 8.0],
+        'price_volatility_7d': [0.5] * 3,
+        'price_volatility_30d': [0.8] * 3,
+        'price_momentum_7d': [0.01] * 3,
+        'price_momentum_30d': [0.02] * 3,
+        'month': [10] * 3,
+        'quarter': [4] * 3
+    }
+    assert list(expected) == main.FEATURE_COLUMNS
+    for name, values in expected.items():
+        np.testing.assert_allclose(column(feat_matrix, name), values, rtol=1e-6, err_msg=name)
+
+
+def test_build_feature_matrix_empty():
+    assert main.build_feature_matrix([]).shape == (0, len(main.FEATURE_COLUMNS))
+
+
+def test_build_bond_features_matches_table_row():
+    features = main.build_bond_features(NULL_ROW)
+
+    assert list(features) == main.FEATURE_COLUMNS
+    np.testing.assert_array_equal(main.feature_vector(features), main.build_feature_matrix([NULL_ROW])[0])
+
+
+def test_refresh_feature_table_indexes_rows_by_bond_id(client):
+    asyncio.run(main.refresh_feature_table())
+
+    feat_matrix, id_to_row = main.app.state.features
+    assert set(id_to_row) == {1, 2, 3}
+    for bond_id, row in {1: FULL_ROW, 2: NULL_ROW, 3: UNKNOWN_RATING_ROW}.items():
+        np.testing.assert_array_equal(feat_matrix[id_to_row[bond_id]], main.build_feature_matrix([row])[0])
+
+
+def test_batch_preserves_request_order(client):
+    response = client.post("/api/predict/batch", json={"bond_ids": [3, 1, 2, 1]})
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["bond_id"] for r in results] == [3, 1, 2, 1]
+    assert [r["t7_price_mean"] for r in results] == pytest.approx([8.0, 7.5, 9.25, 7.5])
+
+    # Bonds outside the feature table are cached for later requests
+    assert set(main.redis_client.store) == {"bond_feat:2", "bond_feat:3"}
+
+
+def test_batch_uses_cached_features(client):
+    features = main.build_bond_features(UNKNOWN_RATING_ROW)
+    main.redis_client.store["bond_feat:2"] = msgpack.packb(dict(features, coupon=4.0))
+
+    response = client.post("/api/predict/batch", json={"bond_ids": [2, 3]})
+
+    assert [r["t7_price_mean"] for r in response.json()] == pytest.approx([4.0, 8.0])
+
+
+def test_batch_unknown_bond_is_404(client):
+    response = client.post("/api/predict/batch", json={"bond_ids": [1, 99]})
+
+    assert response.status_code == 404
+    assert "99" in response.json()["detail"]
+
+
+def test_single_unknown_bond_is_404(client):
+    assert client.get("/api/predict/99").status_code == 404
+
+
+def test_database_errors_are_500_on_both_routes(client, monkeypatch):
+    monkeypatch.setattr(main.app.state, "pool", FakePool({}, fail=True))
+
+    assert client.get("/api/predict/2").status_code == 500
+    assert client.post("/api/predict/batch", json={"bond_ids": [2]}).status_code == 500
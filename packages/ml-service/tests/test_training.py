@@ -0,0 +1,151 @@
+"""
+Equivalence checks for the hand-written training math against sklearn/pandas
+"""
+
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.preprocessing import StandardScaler
+
+import main
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+class DownRedis:
+    async def get(self, key):
+        raise ConnectionError("redis unavailable")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis unavailable")
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(main, "sufficient_stats", {})
+    monkeypatch.setattr(main, "redis_client", FakeRedis())
+
+
+def make_batch(rng, n, first_id):
+    """Engineered trade rows with correlated features and a noisy linear price"""
+    n_features = len(main.FEATURE_COLUMNS)
+    X = rng.normal(size=(n, n_features)) * np.arange(1, n_features + 1) + 50
+    y = X @ rng.normal(size=n_features) + 1000 + rng.normal(size=n)
+    rows = {name: X[:, i] for i, name in enumerate(main.FEATURE_COLUMNS)}
+    rows["price"] = y
+    rows["id"] = np.arange(first_id, first_id + n, dtype=np.int64)
+    return rows, X, y
+
+
+def sklearn_fit(X, y):
+    scaler = StandardScaler().fit(X)
+    model = Ridge(alpha=1.0).fit(scaler.transform(X), y)
+    return scaler, model, model.score(scaler.transform(X), y)
+
+
+def assert_matches_sklearn(stats, X, y):
+    mean, inv_scale, coef, intercept, r2 = main.solve_ridge(stats)
+    scaler, model, score = sklearn_fit(X, y)
+
+    np.testing.assert_allclose(mean, scaler.mean_, rtol=1e-9)
+    np.testing.assert_allclose(inv_scale, 1.0 / scaler.scale_, rtol=1e-6)
+    np.testing.assert_allclose(coef, model.coef_, rtol=1e-4, atol=1e-4)
+    assert intercept == pytest.approx(model.intercept_, rel=1e-9)
+    assert r2 == pytest.approx(score, abs=1e-4)
+
+
+def test_solve_ridge_matches_sklearn():
+    rng = np.random.default_rng(0)
+    rows, X, y = make_batch(rng, 500, first_id=1)
+
+    stats = asyncio.run(main.update_sufficient_stats("general", rows))
+
+    assert int(stats["last_trade_id"]) == 500
+    assert_matches_sklearn(stats, X, y)
+
+
+def test_incremental_batches_match_full_fit():
+    rng = np.random.default_rng(1)
+    first, X1, y1 = make_batch(rng, 300, first_id=1)
+    second, X2, y2 = make_batch(rng, 200, first_id=301)
+
+    asyncio.run(main.update_sufficient_stats("general", first))
+    stats = asyncio.run(main.update_sufficient_stats("general", second))
+
+    assert int(stats["n"]) == 500
+    assert int(stats["last_trade_id"]) == 500
+    assert_matches_sklearn(stats, np.vstack([X1, X2]), np.concatenate([y1, y2]))
+
+
+def test_statistics_round_trip_through_redis():
+    rng = np.random.default_rng(2)
+    rows, X, y = make_batch(rng, 100, first_id=1)
+    asyncio.run(main.update_sufficient_stats("bond_1", rows))
+
+    main.sufficient_stats.clear()
+    stats = asyncio.run(main.load_sufficient_stats("bond_1"))
+
+    assert_matches_sklearn(stats, X, y)
+
+
+def test_statistics_survive_redis_outage(monkeypatch):
+    monkeypatch.setattr(main, "redis_client", DownRedis())
+    rng = np.random.default_rng(3)
+    rows, X, y = make_batch(rng, 100, first_id=1)
+
+    assert asyncio.run(main.load_sufficient_stats("general")) is None
+    stats = asyncio.run(main.update_sufficient_stats("general", rows))
+
+    assert main.sufficient_stats["general"] is stats
+    assert_matches_sklearn(stats, X, y)
+
+
+@pytest.mark.parametrize("blob", [b"not an npz archive", b"PK\x03\x04truncated"])
+def test_undecodable_statistics_are_refolded(blob):
+    main.redis_client.store["ml_stats:general"] = blob
+
+    assert asyncio.run(main.load_sufficient_stats("general")) is None
+    assert "general" not in main.sufficient_stats
+
+
+@pytest.mark.parametrize("n", [100, 100_000])
+def test_engineer_features_matches_pandas(n):
+    # Prices around 1000 with a small step size, where differencing raw
+    # running sums loses precision on long histories
+    rng = np.random.default_rng(4)
+    prices = 1000 + np.cumsum(rng.normal(0, 0.01, n))
+    dates = pd.date_range("2024-01-01", periods=n, freq="h")
+    cols = {
+        "coupon": np.full(n, 7.5, dtype=np.float32),
+        "rating": np.array(["AA", "BBB-", "unrated"] * (n // 3) + ["AAA"] * (n % 3), dtype=object),
+        "price": prices,
+        "date": dates.to_numpy().astype("datetime64[us]")
+    }
+
+    features = main.engineer_features(cols)
+
+    series = pd.Series(prices)
+    for window in (7, 30):
+        np.testing.assert_allclose(
+            features[f"price_volatility_{window}d"], series.rolling(window).std(),
+            rtol=0, atol=1e-6, equal_nan=True
+        )
+        np.testing.assert_allclose(
+            features[f"price_momentum_{window}d"], series.pct_change(window),
+            rtol=1e-9, atol=1e-12, equal_nan=True
+        )
+    np.testing.assert_array_equal(features["month"], dates.month)
+    np.testing.assert_array_equal(features["quarter"], dates.quarter)
+    np.testing.assert_allclose(features["rating_numeric"][:3], [0.8, 0.1, 0.1], rtol=1e-6)